@@ -139,6 +139,14 @@ class BlockwiseDependencyGraph:
             # want to round up only if there is a full write block left.
             self.rounding_term = self.block_write_roi.shape
 
+        # number of write blocks along each axis of the total write roi,
+        # used to assign every block a dense integer index
+        self._block_grid_shape = Coordinate(
+            -(-e // w)
+            for e, w in zip(
+                self.total_write_roi.shape, self.block_write_roi.shape)
+        )
+
         # computed values
         self._level_stride = self.compute_level_stride()
         self._level_offsets = self.compute_level_offsets()
@@ -155,6 +163,25 @@ class BlockwiseDependencyGraph:
             num_blocks += self._num_level_blocks(level)
         return num_blocks
 
+    @property
+    def num_block_indices(self):
+        """Upper bound (exclusive) of the indices returned by
+        ``block_index``."""
+        return int(np.prod(self._block_grid_shape))
+
+    def block_index(self, block):
+        """Get a dense integer index for ``block``, i.e., the position of its
+        write roi in the grid of write rois tiling ``total_write_roi``."""
+        index = 0
+        for b, o, w, n in zip(
+            block.write_roi.begin,
+            self.total_write_roi.begin,
+            self.block_write_roi.shape,
+            self._block_grid_shape,
+        ):
+            index = index * n + (b - o) // w
+        return index
+
     @property
     def inclusion_criteria(self):
         # TODO: Can't we remove this entirely by pre computing the write_roi
@@ -595,6 +622,14 @@ class DependencyGraph:
         for task in self.task_map.values():
             self.__add_task_dependency_graph(task)
 
+        # block indices of each task start after the ones of the previous
+        # task, so they are dense over all tasks
+        self.block_index_offsets = {}
+        self.num_block_indices = 0
+        for task_id, dep_graph in self.task_dependency_graphs.items():
+            self.block_index_offsets[task_id] = self.num_block_indices
+            self.num_block_indices += dep_graph.num_block_indices
+
     @property
     def task_ids(self):
         return self.task_map.keys()
@@ -602,6 +637,13 @@ class DependencyGraph:
     def num_blocks(self, task_id):
         return self.task_dependency_graphs[task_id].num_blocks
 
+    def block_index(self, block):
+        """Get an integer index for ``block``, unique over all tasks and
+        smaller than ``num_block_indices``."""
+        return self.block_index_offsets[
+            block.task_id
+        ] + self.task_dependency_graphs[block.task_id].block_index(block)
+
     def upstream(self, block):
         upstream = self.task_dependency_graphs[block.task_id].upstream(block)
         for upstream_task in self.upstream_tasks[block.task_id]:
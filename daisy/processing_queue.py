@@ -9,10 +9,37 @@ class ProcessingQueue:
     1) blocks that are ready to be scheduled
     2) blocks that are running
     3) how many times blocks have been retried
+
+    Blocks are handed out in the order they became ready ("fifo"), or most
+    recently readied blocks first ("lifo"), which tends to keep processing
+    close to data that was just written.
     """
 
-    def __init__(self, num_roots=0, root_generator=None):
+    __slots__ = (
+        "ready_queue",
+        "processing_blocks",
+        "block_retries",
+        "ready_roots",
+        "root_generator",
+        "pop_ready",
+    )
+
+    def __init__(
+        self,
+        num_roots=0,
+        root_generator=None,
+        schedule_order="fifo",
+    ):
         self.ready_queue = collections.deque()
+        if schedule_order == "fifo":
+            self.pop_ready = self.ready_queue.popleft
+        elif schedule_order == "lifo":
+            self.pop_ready = self.ready_queue.pop
+        else:
+            raise ValueError(
+                f"Unknown schedule order {schedule_order!r}, "
+                "expected 'fifo' or 'lifo'"
+            )
         self.processing_blocks = set()
         self.block_retries = collections.defaultdict(int)
 
@@ -24,11 +51,13 @@ class ProcessingQueue:
         return self.ready_roots + len(self.ready_queue)
 
     def get_next(self):
-        if self.num_ready > 0:
-            if self.ready_roots > 0:
-                self.ready_roots -= 1
-                return next(self.root_generator)
-            else:
-                return self.ready_queue.popleft()
-        else:
-            return None
+        # roots are always handed out before any other ready block
+        if self.ready_roots > 0:
+            return self.__next_root()
+        if self.ready_queue:
+            return self.pop_ready()
+        return None
+
+    def __next_root(self):
+        self.ready_roots -= 1
+        return next(self.root_generator)
@@ -1,3 +1,6 @@
+import collections
+
+
 class ReadySurface:
     """
     The ready surface is a datastructure to keep track of the nodes in a
@@ -17,15 +20,57 @@ class ReadySurface:
     A node is a BOUNDARY node iff
         1) it has been marked as failed
         2) It has upstream dependencies marked as SURFACE
+
+    Internally, nodes are tracked by a key, computed once per node when it
+    is first seen. The ``surface`` and ``boundary`` sets contain keys, not
+    nodes.
+
+    args:
+        get_downstream_nodes: `callable`:
+            Returns the nodes directly dependent on a given node.
+        get_upstream_nodes: `callable`:
+            Returns the nodes a given node directly depends on.
+        node_key: `callable`, optional:
+            Returns a hashable key that uniquely identifies a node, e.g.,
+            ``DependencyGraph.block_index``. Cheap to hash keys (like `int`)
+            speed up the many membership tests. Defaults to the node itself.
     """
 
-    def __init__(self, get_downstream_nodes, get_upstream_nodes):
-        self.downstream = lambda x: list(get_downstream_nodes(x))
-        self.upstream = lambda x: list(get_upstream_nodes(x))
+    def __init__(
+        self,
+        get_downstream_nodes,
+        get_upstream_nodes,
+        node_key=None,
+    ):
+        self.get_downstream_nodes = get_downstream_nodes
+        self.get_upstream_nodes = get_upstream_nodes
+        self.node_key = node_key if node_key is not None else lambda x: x
+
+        # dependencies of nodes that are still of interest. Entries are
+        # dropped once a node no longer needs them, to keep memory
+        # proportional to the surface.
+        # downstream: key -> tuple of (key, node)
+        # upstream: key -> tuple of keys
+        self._downstream_cache = {}
+        self._upstream_cache = {}
 
         self.surface = set()
         self.boundary = set()
 
+        # number of downstream nodes of each SURFACE node that are still
+        # OTHER. A SURFACE node can be dropped once this reaches zero.
+        self.unresolved_downstream = {}
+
+        # keys of all nodes reported as orphans so far. A node can leave the
+        # boundary and be added to it again by a later failure, it must not
+        # be reported twice. Unlike the sets above, this grows with the
+        # number of orphans.
+        self.orphaned = set()
+
+        # worklist of the downstream walk in mark_failure. It is empty
+        # between calls and reused to avoid allocating a new one each time.
+        self._worklist = collections.deque()
+
     def mark_success(self, node):
         """
         Update surface and boundary to account for a `node` marked as a
@@ -41,40 +86,45 @@ class ReadySurface:
             list of nodes that are now free to be scheduled.
         """
 
-        up_nodes = self.upstream(node)
+        key = self.node_key(node)
+        up_keys = self._upstream(key, node)
 
         # check if node is a valid input
         assert all(
-            up_node in self.surface for up_node in up_nodes
+            up_key in self.surface for up_key in up_keys
         ), f"Not all upstream dependencies of {node} are in the surface"
 
-        self.surface.add(node)
+        surface = self.surface
+        surface.add(key)
+        down_nodes = self._downstream(key, node)
+        self.unresolved_downstream[key] = sum(
+            down_key not in self.boundary for down_key, _ in down_nodes
+        )
+
+        exhausted = []
+        # if the counter only reaches zero below, __resolve_downstream marks
+        # node as exhausted, so it must not be added here as well
+        if self.unresolved_downstream[key] == 0:
+            exhausted.append(key)
+
         new_ready_nodes = []
         # check if any downstream nodes need to be added to the boundary
-        for down_node in self.downstream(node):
-            if not self.__add_to_boundary(down_node):
-                if all(
-                        up_node in self.surface
-                        for up_node in self.upstream(down_node)):
-                    new_ready_nodes.append(down_node)
-
-        # check if any of the upstream nodes can be removed from surface
-        for up_node in up_nodes:
-            down_nodes = self.downstream(up_node)
-            # check down node state: 1 = SURFACE, -1 = BOUNDARY, 0 = OTHER
-            contained = [
-                (down_node in self.surface) - (down_node in self.boundary)
-                for down_node in down_nodes
-            ]
-            if all(abs(x) > 0 for x in contained):
-                self.surface.remove(up_node)
-                for down_node, c in zip(down_nodes, contained):
-                    if c < 0:
-                        # node was in boundary. maybe we can remove it
-                        self.__remove_from_boundary(down_node)
-
-        if len(list(self.downstream(node))) == 0:
-            self.surface.remove(node)
+        for down_key, down_node in down_nodes:
+            if self.__add_to_boundary(down_key, down_node, exhausted):
+                continue
+            # down_node is ready if all its upstream nodes are in the surface
+            for up_key in self._upstream(down_key, down_node):
+                if up_key not in surface:
+                    break
+            else:
+                new_ready_nodes.append(down_node)
+
+        # node is no longer OTHER for any of its upstream nodes
+        for up_key in up_keys:
+            self.__resolve_downstream(up_key, exhausted)
+
+        self.__remove_from_surface(exhausted)
+        self._upstream_cache.pop(key, None)
 
         return new_ready_nodes
 
@@ -92,69 +142,117 @@ class ReadySurface:
                 Whether or not to count every orphan, or stop recursing though
                 the dependency tree as early as possible. if False will still
                 return a lower bound on the number of orphans.
+
+        returns:
+            list of nodes that were orphaned by this failure, i.e., that were
+            not reported as orphans by an earlier failure.
         """
-        up_nodes = self.upstream(node)
+        key = self.node_key(node)
+        up_keys = self._upstream(key, node)
 
         # check if node is a valid input
         assert all(
-            up_node in self.surface for up_node in up_nodes
+            up_key in self.surface for up_key in up_keys
         ), f"Not all upstream dependencies of {node} are in the surface"
 
-        self.boundary.add(node)
+        self.boundary.add(key)
 
         # recurse through downstream nodes, adding them to boundary if
         # necessary
-        down_nodes = set(self.downstream(node))
-        orphans = set(down_nodes)
-        while len(down_nodes) > 0:
-            down_node = down_nodes.pop()
-            if self.__add_to_boundary(down_node):
-                # check if any nodes downstream of this node are also boundary
-                # nodes.
-                new_nodes = set(self.downstream(down_node)) - orphans
-                down_nodes = down_nodes.union(new_nodes)
-                orphans = orphans.union(new_nodes)
-            elif count_all_orphans:
-                new_nodes = set(self.downstream(down_node)) - orphans
-                down_nodes = down_nodes.union(new_nodes)
-                orphans - orphans.union(new_nodes)
-
-        # check if any of the upstream nodes can be removed from surface
-        for up_node in up_nodes:
-            down_nodes = self.downstream(up_node)
-            # check down node state: 1 = SURFACE, -1 = BOUNDARY, 0 = OTHER
-            contained = [
-                (down_node in self.surface) - (down_node in self.boundary)
-                for down_node in down_nodes
-            ]
-            if all(abs(x) > 0 for x in contained):
-                self.surface.remove(up_node)
-                for down_node, c in zip(down_nodes, contained):
-                    if c < 0:
-                        # node was in boundary. maybe we can remove it
-                        self.__remove_from_boundary(down_node)
-
-        if len(list(self.upstream(node))) == 0:
-            self.boundary.remove(node)
+        exhausted = []
+        work = self._worklist
+        work.extend(self._downstream(key, node))
+        visited = set(down_key for down_key, _ in work)
+        orphans = []
+        while work:
+            down_key, down_node = work.popleft()
+            if self.__add_to_boundary(down_key, down_node, exhausted):
+                if down_key not in self.orphaned:
+                    self.orphaned.add(down_key)
+                    orphans.append(down_node)
+            elif not count_all_orphans:
+                continue
+            # check if any nodes downstream of this node are also boundary
+            # nodes.
+            for new_key, new_node in self._downstream(down_key, down_node):
+                if new_key not in visited:
+                    visited.add(new_key)
+                    work.append((new_key, new_node))
+
+        # node is no longer OTHER for any of its upstream nodes
+        for up_key in up_keys:
+            self.__resolve_downstream(up_key, exhausted)
+
+        self.__remove_from_surface(exhausted)
+
+        if len(up_keys) == 0:
+            self.boundary.remove(key)
+            self._upstream_cache.pop(key, None)
+
+        # the downstream nodes of failed nodes are not needed anymore
+        self._downstream_cache.pop(key, None)
+        for visited_key in visited:
+            self._downstream_cache.pop(visited_key, None)
 
         return orphans
 
-    def __add_to_boundary(self, node):
-        up_nodes = self.upstream(node)
-        if node not in self.boundary and any(
-            up_node in self.boundary for up_node in up_nodes
-        ):
-            self.boundary.add(node)
-            return True
+    def _downstream(self, key, node):
+        down_nodes = self._downstream_cache.get(key)
+        if down_nodes is None:
+            node_key = self.node_key
+            down_nodes = tuple(
+                (node_key(down_node), down_node)
+                for down_node in self.get_downstream_nodes(node)
+            )
+            self._downstream_cache[key] = down_nodes
+        return down_nodes
+
+    def _upstream(self, key, node):
+        up_keys = self._upstream_cache.get(key)
+        if up_keys is None:
+            up_keys = tuple(map(self.node_key, self.get_upstream_nodes(node)))
+            self._upstream_cache[key] = up_keys
+        return up_keys
+
+    def __resolve_downstream(self, key, exhausted):
+        self.unresolved_downstream[key] -= 1
+        if self.unresolved_downstream[key] == 0:
+            exhausted.append(key)
+
+    def __remove_from_surface(self, keys):
+        # removal is deferred until all counters are updated, so that
+        # boundary nodes are not dropped while still being traversed
+        for key in keys:
+            self.surface.remove(key)
+            del self.unresolved_downstream[key]
+            for down_key, down_node in self._downstream_cache.pop(key):
+                # node was in boundary. maybe we can remove it
+                self.__remove_from_boundary(down_key, down_node)
+
+    def __add_to_boundary(self, key, node, exhausted):
+        boundary = self.boundary
+        if key in boundary:
+            return False
+        up_keys = self._upstream(key, node)
+        for up_key in up_keys:
+            if up_key in boundary:
+                break
         else:
             return False
 
-    def __remove_from_boundary(self, node):
-        up_nodes = self.upstream(node)
-        if node in self.boundary and all(
-            up_node not in self.surface for up_node in up_nodes
+        boundary.add(key)
+        for up_key in up_keys:
+            if up_key in self.surface:
+                self.__resolve_downstream(up_key, exhausted)
+        return True
+
+    def __remove_from_boundary(self, key, node):
+        if key in self.boundary and all(
+            up_key not in self.surface
+            for up_key in self._upstream(key, node)
         ):
-            self.boundary.remove(node)
+            self.boundary.remove(key)
+            self._upstream_cache.pop(key, None)
             return True
         else:
             return False
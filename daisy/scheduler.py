@@ -4,11 +4,12 @@ from .dependency_graph import DependencyGraph
 from .ready_surface import ReadySurface
 from .task_state import TaskState
 from .processing_queue import ProcessingQueue
+from .task_entry import TaskEntry
 from .task import Task
 from .block import BlockStatus
 
+from types import MappingProxyType
 from typing import List
-import collections
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,26 +34,53 @@ class Scheduler:
             If False, orphaned blocks will be counted as "pending" in
             the task state since there is no way to tell the difference
             between the two types without enumerating all orphans.
+        schedule_order: str:
+            The order in which ready blocks of a task are handed out.
+            "fifo" (the default) returns blocks in the order they became
+            ready. "lifo" returns the most recently readied blocks first,
+            i.e., processing proceeds depth first through the dependency
+            graph. Root blocks are always handed out first.
     """
 
-    def __init__(self, tasks: List[Task], count_all_orphans=True):
+    def __init__(
+        self,
+        tasks: List[Task],
+        count_all_orphans=True,
+        schedule_order="fifo",
+    ):
         self.dependency_graph = DependencyGraph(tasks)
         self.ready_surface = ReadySurface(
-            self.dependency_graph.downstream, self.dependency_graph.upstream
+            self.dependency_graph.downstream,
+            self.dependency_graph.upstream,
+            node_key=self.dependency_graph.block_index,
         )
 
-        self.task_map = {}
-        self.task_states = collections.defaultdict(TaskState)
-        self.task_queues = collections.defaultdict(ProcessingQueue)
+        self.schedule_order = schedule_order
 
-        # root tasks is a mapping from task_id -> (num_roots, root_generator)
+        # task_id -> TaskEntry
+        self.task_entries = {}
+
+        # the dependency graph already enumerated all tasks and their
+        # upstream tasks, so initialize them in a single pass over it.
+        # roots is a mapping from task_id -> (num_roots, root_generator)
         roots = self.dependency_graph.roots()
-        for task_id, (num_roots, root_gen) in roots.items():
-            self.task_states[task_id].ready_count += num_roots
-            self.task_queues[task_id] = ProcessingQueue(num_roots, root_gen)
+        for task_id, task in self.dependency_graph.task_map.items():
+            self.__init_task(task, roots.get(task_id))
 
-        for task in tasks:
-            self.__init_task(task)
+        # read-only views of the registry, built once since the set of tasks
+        # does not change. The objects in them are the ones in task_entries.
+        self.task_map = MappingProxyType({
+            task_id: entry.task
+            for task_id, entry in self.task_entries.items()
+        })
+        self.task_states = MappingProxyType({
+            task_id: entry.state
+            for task_id, entry in self.task_entries.items()
+        })
+        self.task_queues = MappingProxyType({
+            task_id: entry.queue
+            for task_id, entry in self.task_entries.items()
+        })
 
         self.count_all_orphans = count_all_orphans
 
@@ -61,9 +89,9 @@ class Scheduler:
         Get a list of tasks that currently have blocks available for scheduling
         """
         ready_tasks = []
-        for task_id, task_state in self.task_states.items():
-            if task_state.ready_count > 0:
-                ready_tasks.append(self.task_map[task_id])
+        for entry in self.task_entries.values():
+            if entry.state.ready_count > 0:
+                ready_tasks.append(entry.task)
         return ready_tasks
 
     def acquire_block(self, task_id):
@@ -79,34 +107,57 @@ class Scheduler:
                 A block that can be run without worry of
                 conflicts.
         """
-        while True:
-            block = self.task_queues[task_id].get_next()
-            if block is not None:
-
-                # update states
-                self.task_states[task_id].ready_count -= 1
-                self.task_states[task_id].processing_count += 1
-
-                pre_check_ret = self.__precheck(block)
-                if pre_check_ret:
-                    logger.debug(
-                        "Skipping block (%s); already processed.",
-                        block.block_id)
-                    block.status = BlockStatus.SUCCESS
-                    self.task_states[task_id].skipped_count += 1
-                    # adding block so release_block() can remove it
-                    self.task_queues[task_id].processing_blocks.add(
-                        block.block_id)
-                    self.release_block(block)
-                    continue
-                else:
-                    self.task_states[task_id].started = True
-                    self.task_queues[task_id].processing_blocks.add(
-                        block.block_id)
-                    return block
-
-            else:
-                return None
+        blocks = self.acquire_blocks(task_id, 1)
+        return blocks[0] if blocks else None
+
+    def acquire_blocks(self, task_id, num_blocks):
+        """
+        Get up to ``num_blocks`` blocks that are ready to process for task
+        with given task_id.
+
+        Args:
+            task_id(``int``):
+                The task for which you want blocks
+
+            num_blocks(``int``):
+                The maximum number of blocks to return
+
+        Return:
+            ``list`` of ``Block``:
+                Blocks that can be run without worry of
+                conflicts. Fewer than ``num_blocks`` (possibly none)
+                if not enough blocks are ready.
+        """
+        entry = self.task_entries[task_id]
+        task_state = entry.state
+        task_queue = entry.queue
+
+        blocks = []
+        while len(blocks) < num_blocks:
+            block = task_queue.get_next()
+            if block is None:
+                break
+
+            task_state.ready_count -= 1
+
+            if self.__precheck(block):
+                logger.debug(
+                    "Skipping block (%s); already processed.",
+                    block.block_id)
+                block.status = BlockStatus.SUCCESS
+                task_state.skipped_count += 1
+                # skipped blocks never enter processing, mark them
+                # completed directly instead of going through release_block()
+                self.__complete_block(block)
+                continue
+
+            task_queue.processing_blocks.add(block.block_id)
+            blocks.append(block)
+
+        if blocks:
+            task_state.started = True
+            task_state.processing_count += len(blocks)
+        return blocks
 
     def release_block(self, block):
         """
@@ -129,77 +180,95 @@ class Scheduler:
             as solved made some blocks in B available for
             processing, task B would be returned with its state.
         """
-        task_id = block.task_id
-        self.__remove_from_processing_blocks(block)
-        if block.status == BlockStatus.SUCCESS:
-            new_blocks = self.ready_surface.mark_success(block)
-            self.task_states[block.task_id].completed_count += 1
-            updated_tasks = self.__update_ready_queue(new_blocks)
-            return updated_tasks
-        if block.status == BlockStatus.FAILED:
-            if (
-                self.task_queues[task_id].block_retries[block.block_id]
-                >= self.task_map[task_id].max_retries
-            ):
-                logger.debug("Marking %s as permanently failed", block)
-                orphans = self.ready_surface.mark_failure(
-                    block, count_all_orphans=self.count_all_orphans
-                )
-                logger.debug("Number of orphans is %d", len(orphans))
-                self.task_states[block.task_id].failed_count += 1
-                for orphan in orphans:
-                    self.task_states[orphan.task_id].orphaned_count += 1
-                return {}
-            else:
-                logger.debug("Marking %s as temporarily failed", block)
-                self.__queue_ready_block(block)
-                self.task_queues[task_id].block_retries[block.block_id] += 1
-                return {task_id: self.task_states[task_id]}
-        else:
+        handler = self.__release_handlers.get(block.status)
+        if handler is None:
             raise RuntimeError(
                 f"Unexpected status for released block: {block.status} {block}"
                 )
 
-    def __init_task(self, task):
-        if task.task_id not in self.task_map:
-            self.task_map[task.task_id] = task
-            num_blocks = self.dependency_graph.num_blocks(task.task_id)
-            self.task_states[
-                task.task_id
-            ].total_block_count = num_blocks
+        entry = self.task_entries[block.task_id]
+        entry.queue.processing_blocks.remove(block.block_id)
+        entry.state.processing_count -= 1
+
+        return handler(self, block)
+
+    def __init_task(self, task, root):
+        task_id = task.task_id
+        task_state = TaskState()
+        task_state.total_block_count = self.dependency_graph.num_blocks(
+            task_id)
+
+        if root is not None:
+            num_roots, root_gen = root
+            task_state.ready_count = num_roots
+            task_queue = ProcessingQueue(
+                num_roots, root_gen, self.schedule_order)
+        else:
+            task_queue = ProcessingQueue(schedule_order=self.schedule_order)
+
+        self.task_entries[task_id] = TaskEntry(task, task_state, task_queue)
 
-            for upstream_task in task.requires():
-                self.__init_task(upstream_task)
+    def __complete_block(self, block):
+        new_blocks = self.ready_surface.mark_success(block)
+        self.task_entries[block.task_id].state.completed_count += 1
+        return self.__update_ready_queue(new_blocks)
+
+    def __release_failure(self, block):
+        task_id = block.task_id
+        entry = self.task_entries[task_id]
+        task_state = entry.state
+        task_queue = entry.queue
+
+        if (
+            task_queue.block_retries[block.block_id]
+            >= entry.task.max_retries
+        ):
+            logger.debug("Marking %s as permanently failed", block)
+            orphans = self.ready_surface.mark_failure(
+                block, count_all_orphans=self.count_all_orphans
+            )
+            logger.debug("Number of orphans is %d", len(orphans))
+            task_state.failed_count += 1
+            for orphan in orphans:
+                self.task_entries[orphan.task_id].state.orphaned_count += 1
+            return {}
+        else:
+            logger.debug("Marking %s as temporarily failed", block)
+            self.__queue_ready_block(block)
+            task_queue.block_retries[block.block_id] += 1
+            return {task_id: task_state}
 
     def __queue_ready_block(self, block, index=None):
+        entry = self.task_entries[block.task_id]
         if index is None:
-            self.task_queues[block.task_id].ready_queue.append(block)
+            entry.queue.ready_queue.append(block)
         else:
-            self.task_queues[block.task_id].ready_queue.insert(index, block)
-        self.task_states[block.task_id].ready_count += 1
-
-    def __remove_from_processing_blocks(self, block):
-        self.task_queues[block.task_id].processing_blocks.remove(
-            block.block_id)
-        self.task_states[block.task_id].processing_count -= 1
+            entry.queue.ready_queue.insert(index, block)
+        entry.state.ready_count += 1
+        return entry.state
 
     def __update_ready_queue(self, ready_blocks):
         updated_tasks = {}
         for ready_block in ready_blocks:
-            self.__queue_ready_block(ready_block)
-            task_state = self.task_states[ready_block.task_id]
+            task_state = self.__queue_ready_block(ready_block)
             updated_tasks[ready_block.task_id] = task_state
         return updated_tasks
 
     def __precheck(self, block):
+        check_function = self.task_entries[block.task_id].task.check_function
+        if check_function is None:
+            return False
         try:
             # pre_check can intermittently fail
             # so we wrap it in a try block
-            if self.task_map[block.task_id].check_function is not None:
-                return self.task_map[block.task_id].check_function(block)
-            else:
-                return False
+            return check_function(block)
         except Exception:
             logger.exception(
                 f"pre_check() exception for block {block.block_id}")
             return False
+
+    # release_block() dispatches on the status of the released block
+    __release_handlers = {
+        BlockStatus.SUCCESS: __complete_block,
+        BlockStatus.FAILED: __release_failure,
+    }
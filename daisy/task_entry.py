@@ -0,0 +1,17 @@
+class TaskEntry:
+    """
+    A helper class for the scheduler.
+
+    Groups everything the scheduler keeps per task, such that a single
+    lookup by task_id gives access to:
+    1) the ``Task`` itself
+    2) its ``TaskState``
+    3) its ``ProcessingQueue``
+    """
+
+    __slots__ = ("task", "state", "queue")
+
+    def __init__(self, task, state, queue):
+        self.task = task
+        self.state = state
+        self.queue = queue
@@ -1,4 +1,15 @@
 class TaskState:
+    __slots__ = (
+        "started",
+        "total_block_count",
+        "ready_count",
+        "processing_count",
+        "completed_count",
+        "skipped_count",
+        "failed_count",
+        "orphaned_count",
+    )
+
     def __init__(self):
         self.started = False
         self.total_block_count = 0
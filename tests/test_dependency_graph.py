@@ -79,6 +79,24 @@ def test_downstream(task_blocks):
     )
 
 
+@pytest.mark.parametrize("task", tasks)
+def test_block_index(task):
+    graph = BlockwiseDependencyGraph(
+        task.task_id,
+        task.read_roi,
+        task.write_roi,
+        task.read_write_conflict,
+        task.fit,
+        total_read_roi=task.total_roi,
+    )
+    indices = [
+        graph.block_index(block)
+        for block, _ in graph.enumerate_all_dependencies()
+    ]
+    assert len(set(indices)) == len(indices)
+    assert all(0 <= index < graph.num_block_indices for index in indices)
+
+
 def process_block(block):
     pass
 
@@ -0,0 +1,97 @@
+from daisy.ready_surface import ReadySurface
+
+import pytest
+
+import random
+
+
+def make_surface(downstream):
+    upstream = {node: [] for node in downstream}
+    for node, down_nodes in downstream.items():
+        for down_node in down_nodes:
+            upstream[down_node].append(node)
+    surface = ReadySurface(lambda x: downstream[x], lambda x: upstream[x])
+    return surface, upstream
+
+
+def random_dag(rng, num_nodes=12, edge_probability=0.3):
+    return {
+        i: [
+            j for j in range(i + 1, num_nodes)
+            if rng.random() < edge_probability
+        ]
+        for i in range(num_nodes)
+    }
+
+
+def check_invariants(surface, downstream, succeeded):
+    assert set(surface.unresolved_downstream) == surface.surface
+    assert surface.surface <= succeeded
+    assert not (surface.boundary & succeeded)
+    for node in surface.surface:
+        unresolved = [
+            down_node
+            for down_node in downstream[node]
+            if down_node not in succeeded
+            and down_node not in surface.boundary
+        ]
+        assert surface.unresolved_downstream[node] == len(unresolved), node
+
+
+def test_success_after_boundary_resolves_node():
+    # failing 3 orphans 4 and 5, 5 leaves the boundary again with 0.
+    # Succeeding 2 re-adds 5 to the boundary, which resolves the last
+    # unresolved downstream node of 2 itself
+    downstream = {0: [5], 1: [2], 2: [4, 5], 3: [4], 4: [5], 5: [], 6: []}
+    surface, _ = make_surface(downstream)
+
+    surface.mark_success(0)
+    surface.mark_success(6)
+    surface.mark_failure(3)
+    surface.mark_success(1)
+    assert surface.mark_success(2) == []
+
+    assert surface.surface == set()
+    assert surface.boundary == set()
+    assert surface.unresolved_downstream == {}
+
+
+def test_orphans_reported_once_across_failures():
+    # 3 depends on 0, 1, and 2. Failing 1 orphans 3, which then leaves the
+    # boundary since 0 leaves the surface. Failing 2 adds 3 to the boundary
+    # again, but it must not be reported as orphan a second time.
+    downstream = {0: [3], 1: [3], 2: [3], 3: []}
+    surface, _ = make_surface(downstream)
+
+    surface.mark_success(0)
+    assert list(surface.mark_failure(1, count_all_orphans=True)) == [3]
+    assert 3 not in surface.boundary
+    assert len(surface.mark_failure(2, count_all_orphans=True)) == 0
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_success_and_failure(seed):
+    rng = random.Random(seed)
+    downstream = random_dag(rng)
+    surface, upstream = make_surface(downstream)
+
+    ready = [node for node in downstream if not upstream[node]]
+    succeeded = set()
+    failed = set()
+    orphans = []
+    while ready:
+        node = ready.pop(rng.randrange(len(ready)))
+        if rng.random() < 0.2:
+            failed.add(node)
+            orphans.extend(surface.mark_failure(node, count_all_orphans=True))
+        else:
+            succeeded.add(node)
+            new_ready = surface.mark_success(node)
+            for ready_node in new_ready:
+                assert all(up in succeeded for up in upstream[ready_node])
+            ready += new_ready
+        check_invariants(surface, downstream, succeeded)
+
+    # every node is accounted for exactly once
+    assert len(orphans) == len(set(orphans))
+    assert len(succeeded) + len(failed) + len(orphans) == len(downstream)
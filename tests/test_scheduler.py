@@ -6,6 +6,7 @@ from daisy import Roi
 import pytest
 
 import logging
+import random
 
 logger = logging.getLogger(__name__)
 
@@ -188,6 +189,65 @@ def test_simple_acquire_block(task_1d):
     assert block.block_id == expected_block.block_id
 
 
+def test_skip_prechecked_blocks():
+    task = Task(
+        task_id="test_1d",
+        total_roi=Roi((0,), (4,)),
+        read_roi=Roi((0,), (3,)),
+        write_roi=Roi((1,), (1,)),
+        process_function=process_block,
+        check_function=lambda b: b.block_id[1] == 2,
+    )
+    scheduler = Scheduler([task])
+
+    # block 2 passes the check, so block 1 becomes ready right away
+    block = scheduler.acquire_block(task.task_id)
+    assert block.block_id == ("test_1d", 1)
+
+    task_state = scheduler.task_states[task.task_id]
+    assert task_state.skipped_count == 1
+    assert task_state.completed_count == 1
+    assert task_state.processing_count == 1
+    assert task_state.ready_count == 0
+
+
+def test_acquire_blocks(task_2d):
+    scheduler = Scheduler([task_2d])
+
+    blocks = scheduler.acquire_blocks(task_2d.task_id, 3)
+    assert [block.block_id[1] for block in blocks] == [12, 23, 25]
+
+    # only one block of Level 1 is left
+    blocks += scheduler.acquire_blocks(task_2d.task_id, 3)
+    assert [block.block_id[1] for block in blocks] == [12, 23, 25, 40]
+    assert scheduler.acquire_blocks(task_2d.task_id, 3) == []
+
+    task_state = scheduler.task_states[task_2d.task_id]
+    assert task_state.processing_count == 4
+    assert task_state.ready_count == 0
+
+
+@pytest.mark.parametrize(
+    "schedule_order, expected", [("fifo", [8, 17]), ("lifo", [17, 8])]
+)
+def test_schedule_order(task_2d, schedule_order, expected):
+    scheduler = Scheduler([task_2d], schedule_order=schedule_order)
+
+    blocks = scheduler.acquire_blocks(task_2d.task_id, 4)
+    # releasing 12 frees 8, releasing 23 frees 17
+    for block in blocks[:2]:
+        block.status = BlockStatus.SUCCESS
+        scheduler.release_block(block)
+
+    blocks = scheduler.acquire_blocks(task_2d.task_id, 2)
+    assert [block.block_id[1] for block in blocks] == expected
+
+
+def test_invalid_schedule_order(task_2d):
+    with pytest.raises(ValueError):
+        Scheduler([task_2d], schedule_order="random")
+
+
 def test_retries(task_1d):
     scheduler = Scheduler([task_1d])
 
@@ -229,6 +289,81 @@ def test_orphan_count(task_1d):
     assert scheduler.task_states[task_1d.task_id].orphaned_count == 1
 
 
+@pytest.mark.parametrize("count_all_orphans", [True, False])
+def test_orphans_counted_once(count_all_orphans):
+    task = Task(
+        task_id="test_2d",
+        total_roi=Roi((0, 0), (6, 6)),
+        read_roi=Roi((0, 0), (3, 3)),
+        write_roi=Roi((1, 1), (1, 1)),
+        process_function=process_block,
+        check_function=None,
+        max_retries=0,
+    )
+    scheduler = Scheduler([task], count_all_orphans=count_all_orphans)
+
+    # fail all of Level 1, every other block shares some of these upstream
+    # blocks and must only be counted as orphan once
+    blocks = [scheduler.acquire_block(task.task_id) for _ in range(4)]
+    for block in blocks:
+        block.status = BlockStatus.FAILED
+        scheduler.release_block(block)
+
+    task_state = scheduler.task_states[task.task_id]
+    assert task_state.failed_count == 4
+    assert task_state.orphaned_count == 12
+    assert task_state.is_done()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_orphans_counted_once_across_tasks(seed):
+    upstream_task = Task(
+        task_id="a",
+        total_roi=Roi((0, 0), (8, 7)),
+        read_roi=Roi((0, 0), (3, 5)),
+        write_roi=Roi((1, 2), (1, 1)),
+        process_function=process_block,
+        check_function=None,
+        fit="shrink",
+        max_retries=0,
+    )
+    downstream_task = Task(
+        task_id="b",
+        total_roi=Roi((0, 0), (8, 7)),
+        read_roi=Roi((0, 0), (3, 5)),
+        write_roi=Roi((1, 2), (1, 1)),
+        process_function=process_block,
+        check_function=None,
+        fit="valid",
+        max_retries=0,
+        upstream_tasks=[upstream_task],
+    )
+    scheduler = Scheduler([downstream_task])
+
+    # fail some blocks at random, separate failures orphan overlapping
+    # blocks in the downstream task
+    rng = random.Random(seed)
+    while True:
+        blocks = []
+        for task_id in ["a", "b"]:
+            block = scheduler.acquire_block(task_id)
+            while block is not None:
+                blocks.append(block)
+                block = scheduler.acquire_block(task_id)
+        if not blocks:
+            break
+        for block in blocks:
+            if rng.random() < 0.2:
+                block.status = BlockStatus.FAILED
+            else:
+                block.status = BlockStatus.SUCCESS
+            scheduler.release_block(block)
+
+    # is_done() requires completed + failed + orphaned == total
+    for task_state in scheduler.task_states.values():
+        assert task_state.is_done(), task_state
+
+
 def test_simple_release_block(task_1d):
     scheduler = Scheduler([task_1d])
     block = scheduler.acquire_block(task_1d.task_id)
@@ -244,6 +379,20 @@ def test_simple_release_block(task_1d):
     assert block.block_id == expected_block.block_id
 
 
+def test_release_unexpected_status(task_1d):
+    scheduler = Scheduler([task_1d])
+    block = scheduler.acquire_block(task_1d.task_id)
+    block.status = BlockStatus.PROCESSING
+    with pytest.raises(RuntimeError):
+        scheduler.release_block(block)
+
+    # the block is still being processed and can be released properly
+    assert scheduler.task_states[task_1d.task_id].processing_count == 1
+    block.status = BlockStatus.SUCCESS
+    scheduler.release_block(block)
+    assert scheduler.task_states[task_1d.task_id].completed_count == 1
+
+
 def test_complete_task(task_2d):
     scheduler = Scheduler([task_2d])
 